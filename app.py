@@ -1,89 +1,250 @@
 # -----------------------------------------------------------
 #  DuooBot Backend — Clean Unified Version (Render‑ready)
 # -----------------------------------------------------------
-from flask import Flask, request, jsonify
-from flasgger import Swagger
-from marshmallow import Schema, fields
+# Must run before any socket/SQLAlchemy import so blocking I/O (DNS,
+# SQLite, state flushes) yields to other chats under `gunicorn -k gevent`.
+try:
+    from gevent import monkey
+    monkey.patch_all()
+except ImportError:  # pragma: no cover — plain threaded dev server
+    pass
+
+from flask import Flask, request
 from flask_cors import CORS
-import os, uuid, json, socket
+import os, copy, logging, secrets, socket, threading, time, queue
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from functools import lru_cache
 
-from conversation_flow import Conversation
-from database import SessionLocal
-from sqlalchemy import text as sql_text
+from conversation_flow import Conversation, Reply
+from database import engine
+from utils import json_tools
 
 # -----------------------------------------------------------
 #  Flask + Swagger setup
 # -----------------------------------------------------------
+# f-string prints on the request path format even when nobody is reading;
+# lazy %-style logging costs nothing when the level (or handler) drops it.
+log = logging.getLogger("duoobot")
+# Production raises the floor to WARNING — the per-request INFO chatter
+# goes away but tracebacks and dropped-write warnings still reach
+# stdout, where Render captures them.
+_PROD = os.environ.get("FLASK_ENV") == "production"
+logging.basicConfig(
+    level=logging.WARNING if _PROD else logging.INFO,
+    format="%(levelname)s %(name)s: %(message)s",
+)
+
 app = Flask(__name__)
+# Anything still routed through Flask's JSON provider (e.g. the Swagger
+# spec render) shouldn't pay for key sorting or pretty indentation.
+app.config["JSON_SORT_KEYS"] = False
+if hasattr(app, "json"):  # Flask ≥ 2.3 provider API
+    app.json.sort_keys = False
+    app.json.compact = True
 CORS(app)
 
-# --- Inline schema models for Swagger ---
-class ChatBody(Schema):
-    text = fields.Str(required=True, metadata={"example": "Build me a website"})
-    uid = fields.Str(required=False, metadata={"example": "demo123"})
-    displayName = fields.Str(required=False, metadata={"example": "Sandy"})
-
-class ResetBody(Schema):
-    uid = fields.Str(required=True, metadata={"example": "demo123"})
-
-class DomainBody(Schema):
-    domain = fields.Str(required=True, metadata={"example": "duobits"})
-    tlds = fields.List(fields.Str(), metadata={"example": [".com", ".in", ".net"]})
-
-swagger_template = {
-    "openapi": "3.0.0",
-    "info": {
-        "title": "DuooBot API Docs",
-        "version": "1.0.0",
-        "description": "Interactive Swagger UI for DuooBot endpoints",
-    },
-    "components": {
-        "schemas": {
-            "ChatBody": ChatBody().fields,
-            "ResetBody": ResetBody().fields,
-            "DomainBody": DomainBody().fields,
+# Swagger (flasgger + marshmallow) is dev tooling — importing it costs real
+# cold-start time on Render's free tier, so production wake-ups skip it.
+SWAGGER_ENABLED = (
+    os.environ.get("FLASK_ENV", "development") != "production"
+    or os.environ.get("ENABLE_SWAGGER") == "1"
+)
+
+def setup_swagger(app):
+    """Import and wire flasgger/marshmallow only when docs are wanted."""
+    from flasgger import Swagger
+    from marshmallow import Schema, fields
+
+    # --- Inline schema models for Swagger ---
+    class ChatBody(Schema):
+        text = fields.Str(required=True, metadata={"example": "Build me a website"})
+        uid = fields.Str(required=False, metadata={"example": "demo123"})
+        displayName = fields.Str(required=False, metadata={"example": "Sandy"})
+
+    class ResetBody(Schema):
+        uid = fields.Str(required=True, metadata={"example": "demo123"})
+
+    class DomainBody(Schema):
+        domain = fields.Str(required=True, metadata={"example": "duobits"})
+        tlds = fields.List(fields.Str(), metadata={"example": [".com", ".in", ".net"]})
+
+    @lru_cache(maxsize=1)
+    def build_swagger_template():
+        """Build the OpenAPI template once — schema instantiation isn't free."""
+        return {
+            "openapi": "3.0.0",
+            "info": {
+                "title": "DuooBot API Docs",
+                "version": "1.0.0",
+                "description": "Interactive Swagger UI for DuooBot endpoints",
+            },
+            "components": {
+                "schemas": {
+                    "ChatBody": ChatBody().fields,
+                    "ResetBody": ResetBody().fields,
+                    "DomainBody": DomainBody().fields,
+                }
+            },
         }
-    },
-}
-app.config["SWAGGER"] = {"uiversion": 3, "openapi": "3.0.0"}
-swagger = Swagger(app, template=swagger_template)
+
+    app.config["SWAGGER"] = {"uiversion": 3, "openapi": "3.0.0"}
+    Swagger(app, template=build_swagger_template())
+
+    # Flasgger re-renders the spec on every /apispec_1.json hit even though it
+    # never changes after boot — serve the first render as cached bytes instead.
+    _spec_bytes = {}
+    for _endpoint, _view in list(app.view_functions.items()):
+        if "apispec" not in _endpoint:
+            continue
+        def _cached_spec(*args, _endpoint=_endpoint, _view=_view, **kwargs):
+            if _endpoint not in _spec_bytes:
+                _spec_bytes[_endpoint] = _view(*args, **kwargs).get_data()
+            return app.response_class(_spec_bytes[_endpoint], mimetype="application/json")
+        app.view_functions[_endpoint] = _cached_spec
+
+if SWAGGER_ENABLED:
+    setup_swagger(app)
 
 # -----------------------------------------------------------
 #  Session & persistence
 # -----------------------------------------------------------
-sessions = {}
-STATE_FILE = "convo_cache.json"
+try:
+    import msgpack                     # binary journal: smaller, no escape handling
+except ImportError:                    # pragma: no cover — fall back to JSON lines
+    msgpack = None
+
+sessions = OrderedDict()               # LRU order: least-recent first
+STATE_FILE = "convo_cache.json"        # legacy single-file cache (read-only now)
+# Separate filenames per format so an upgrade never replays the wrong codec.
+STATE_LOG = "convo_cache.msgpack" if msgpack else "convo_cache.log"
+COMPACT_BYTES = 4 * 1024 * 1024        # rewrite the log once it grows past this
+FLUSH_DELAY = 1.0                      # coalesce window for the flusher thread
+
+if msgpack is not None:
+    def _pack_record(record) -> bytes:
+        return msgpack.packb(record, use_bin_type=True)
+
+    def _iter_records(data: bytes):
+        unpacker = msgpack.Unpacker(raw=False)
+        unpacker.feed(data)
+        yield from unpacker
+else:
+    def _pack_record(record) -> bytes:
+        return json_tools.dumps(record) + b"\n"
+
+    def _iter_records(data: bytes):
+        for line in data.splitlines():
+            if line:
+                yield json_tools.loads(line)
 
-def save_state_to_file():
-    """Persist in‑memory sessions to a JSON cache."""
+_flush_queue = queue.Queue()
+
+def _append_states(uids):
+    """Append one journal line per changed uid; state=None is a tombstone."""
     try:
-        with open(STATE_FILE, "w", encoding="utf-8") as f:
-            json.dump({uid: c.state for uid, c in sessions.items()}, f)
+        with open(STATE_LOG, "ab") as journal:
+            for uid in uids:
+                convo = sessions.get(uid)
+                state = convo.state if convo is not None else None
+                journal.write(_pack_record({"uid": uid, "state": state}))
+        if os.path.getsize(STATE_LOG) > COMPACT_BYTES:
+            _compact_log()
     except Exception as err:
-        print(f"⚠️ Could not persist sessions: {err}")
+        log.warning("Could not journal session state: %s", err)
+
+def _compact_log():
+    """Rewrite the journal as one snapshot line per live session."""
+    tmp = STATE_LOG + ".tmp"
+    with open(tmp, "wb") as f:
+        # Snapshot first — request handlers insert/evict concurrently and
+        # iterating the live dict from this thread raises "mutated during
+        # iteration" under the threaded dev server.
+        for uid, convo in list(sessions.items()):
+            f.write(_pack_record({"uid": uid, "state": convo.state}))
+    os.replace(tmp, STATE_LOG)  # atomic swap — no torn reads on crash
+
+def _flusher():
+    """Daemon loop: coalesce dirty uids for up to FLUSH_DELAY, then write once."""
+    while True:
+        pending = {_flush_queue.get()}
+        deadline = time.monotonic() + FLUSH_DELAY
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                pending.add(_flush_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        _append_states(pending)
+
+threading.Thread(target=_flusher, daemon=True, name="state-flusher").start()
+
+def mark_dirty(uid):
+    """Hand a changed uid to the background flusher (non-blocking)."""
+    _flush_queue.put(uid)
 
 def load_state_from_file():
-    """Reload sessions from disk on startup."""
-    if not os.path.exists(STATE_FILE):
-        return
+    """Reload sessions on startup: legacy snapshot first, then journal replay."""
     try:
-        with open(STATE_FILE, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        for uid, st in data.items():
-            sessions[uid] = Conversation(state=st)
-        print(f"♻️ Restored {len(sessions)} conversation states from cache.")
+        if os.path.exists(STATE_FILE):
+            with open(STATE_FILE, "rb") as f:
+                for uid, st in json_tools.loads(f.read()).items():
+                    sessions[uid] = Conversation(state=st)
+        if os.path.exists(STATE_LOG):
+            # One bulk read — decoding from memory beats per-record file reads.
+            with open(STATE_LOG, "rb") as f:
+                data = f.read()
+            for entry in _iter_records(data):
+                if entry["state"] is None:
+                    sessions.pop(entry["uid"], None)
+                else:  # later entries win over earlier ones
+                    sessions[entry["uid"]] = Conversation(state=entry["state"])
+        if sessions:
+            log.info("Restored %d conversation states from cache.", len(sessions))
     except Exception as err:
-        print(f"⚠️ Failed to load cached state: {err}")
+        log.warning("Failed to load cached state: %s", err)
 
 def prune_sessions(limit=100):
-    """Keep memory under control on Render free tier."""
-    if len(sessions) > limit:
-        for uid in list(sessions.keys())[: len(sessions) - limit]:
-            del sessions[uid]
-        print(f"🧹 Pruned sessions to {limit} active users.")
+    """Keep memory under control on Render free tier — O(1) LRU eviction."""
+    pruned = False
+    while len(sessions) > limit:
+        sessions.popitem(last=False)
+        pruned = True
+    if pruned:
+        log.info("Pruned sessions to %d active users.", limit)
 
 load_state_from_file()
 
+# -----------------------------------------------------------
+#  Request parsing
+# -----------------------------------------------------------
+def _read_json():
+    """Parse the request body once with orjson, skipping Flask's re-decode."""
+    return json_tools.loads(request.get_data(cache=False) or b"{}")
+
+def json_response(payload, status=200):
+    """Serialize straight to bytes with orjson — skips jsonify's encoder."""
+    return app.response_class(json_tools.dumps(payload), status=status,
+                              mimetype="application/json")
+
+# State keys exposed to the frontend on normal chat turns
+_PUBLIC_STATE_KEYS = ("step", "name", "project")
+
+# Constant replies, serialized once instead of per request
+_EMPTY_TEXT_REPLY = json_tools.dumps({"reply": {"text": "Please send some text!"}})
+_SERVER_ERROR_REPLY = {"text": "⚠️ Server internal error."}
+
+# Prototype conversation cloned for new users — copy.copy skips __init__,
+# and each clone gets its own fresh state dict so nothing is shared.
+_CONVO_TEMPLATE = Conversation()
+
+def new_conversation(display_name):
+    convo = copy.copy(_CONVO_TEMPLATE)
+    convo.state = {"step": "greeting", "name": display_name.split(" ")[0], "history": []}
+    return convo
+
 # -----------------------------------------------------------
 #  /chat — Main conversation endpoint
 # -----------------------------------------------------------
@@ -104,33 +265,48 @@ def chat():
           description: Successful bot reply (JSON)
     """
     try:
-        data = request.get_json(force=True)
+        data = _read_json()
         if not isinstance(data, dict):
             raise ValueError("Invalid JSON body")
     except Exception as err:
-        return jsonify({"error": f"Invalid JSON: {err}"}), 400
+        return json_response({"error": f"Invalid JSON: {err}"}, status=400)
 
     text = (data.get("text") or "").strip()
-    uid = (data.get("uid") or "").strip() or f"guest_{uuid.uuid4().hex[:8]}"
+    uid = (data.get("uid") or "").strip() or f"guest_{secrets.token_hex(4)}"
     display_name = (data.get("displayName") or "").strip() or "Guest"
 
     if not text:
-        return jsonify({"reply": {"text": "Please send some text!"}}), 400
+        return app.response_class(_EMPTY_TEXT_REPLY, status=400,
+                                  mimetype="application/json")
 
-    convo = sessions.get(uid) or Conversation(user_name=display_name)
-    sessions[uid] = convo
+    convo = sessions.get(uid)
+    if convo is None:
+        convo = new_conversation(display_name)
+        sessions[uid] = convo
+    sessions.move_to_end(uid)
     prune_sessions()
 
     try:
         reply_payload = convo.reply(text)
-        if isinstance(reply_payload, str):
+        if isinstance(reply_payload, Reply):
+            # Dict shape only at the serialization boundary — internally
+            # the flow passes the lighter NamedTuple around.
+            reply_payload = reply_payload._asdict()
+        elif isinstance(reply_payload, str):
             reply_payload = {"text": reply_payload}
     except Exception as err:
-        print(f"❌ Chat error for {uid}: {err}")
-        reply_payload = {"text": "⚠️ Server internal error."}
+        log.exception("Chat error for %s: %s", uid, err)
+        reply_payload = _SERVER_ERROR_REPLY
 
-    save_state_to_file()
-    return jsonify({"reply": reply_payload, "context": convo.state, "user": uid})
+    mark_dirty(uid)
+    # Only what the frontend needs — the full state grows with history and
+    # would be re-serialized on every single turn. ?full=1 returns it all
+    # for debugging.
+    if request.args.get("full") == "1":
+        context = convo.state
+    else:
+        context = {k: convo.state.get(k) for k in _PUBLIC_STATE_KEYS}
+    return json_response({"reply": reply_payload, "context": context, "user": uid})
 
 # -----------------------------------------------------------
 #  /reset — Clear one user's history
@@ -152,22 +328,78 @@ def reset_conversation():
           description: Reset confirmation
     """
     try:
-        data = request.get_json(force=True)
+        data = _read_json()
         uid = (data.get("uid") or "").strip()
         if not uid:
-            return jsonify({"error": "Missing uid"}), 400
+            return json_response({"error": "Missing uid"}, status=400)
 
         sessions.pop(uid, None)
-        save_state_to_file()
-        print(f"🗑️ Conversation reset for user {uid}")
-        return jsonify({"status": "reset", "message": "Conversation cleared successfully"})
+        mark_dirty(uid)  # journals a tombstone for the cleared session
+        log.info("Conversation reset for user %s", uid)
+        return json_response({"status": "reset", "message": "Conversation cleared successfully"})
     except Exception as err:
-        print(f"❌ Reset error: {err}")
-        return jsonify({"error": str(err)}), 500
+        log.error("Reset error: %s", err)
+        return json_response({"error": str(err)}, status=500)
 
 # -----------------------------------------------------------
 #  /domaincheck — Simple availability tool
 # -----------------------------------------------------------
+DEFAULT_TLDS = (".com", ".in", ".net", ".org", ".co")
+DNS_CACHE_TTL = 300                    # seconds — domains don't flip that fast
+DNS_CACHE_MAX = 4096
+_dns_cache = OrderedDict()             # name -> (expires_at, available)
+_dns_lock = threading.Lock()
+
+def _dns_cache_get(name):
+    with _dns_lock:
+        entry = _dns_cache.get(name)
+        if entry and entry[0] > time.monotonic():
+            _dns_cache.move_to_end(name)
+            return entry[1]
+        if entry:
+            del _dns_cache[name]
+    return None
+
+def _dns_cache_put(name, available):
+    with _dns_lock:
+        _dns_cache[name] = (time.monotonic() + DNS_CACHE_TTL, available)
+        _dns_cache.move_to_end(name)
+        while len(_dns_cache) > DNS_CACHE_MAX:
+            _dns_cache.popitem(last=False)
+
+# Shared pool for the fan-out — greenlet-safe under the gevent
+# monkey-patch, unlike a per-request asyncio loop, whose running-loop
+# tracking breaks when two greenlets share one OS thread.
+_DNS_EXECUTOR = ThreadPoolExecutor(max_workers=8, thread_name_prefix="dns-probe")
+
+def _resolve_all(names, timeout=2.0):
+    """Resolve all names concurrently; unresolvable → available."""
+    futures, results = {}, {}
+    for name in names:
+        cached = _dns_cache_get(name)
+        if cached is not None:
+            results[name] = cached
+        else:
+            futures[name] = _DNS_EXECUTOR.submit(socket.gethostbyname, name)
+    deadline = time.monotonic() + timeout
+    out = []
+    for name in names:
+        if name in results:
+            out.append(results[name])
+            continue
+        try:
+            futures[name].result(timeout=max(0.0, deadline - time.monotonic()))
+            available = False
+        except socket.gaierror:
+            available = True
+        except FutureTimeout:
+            out.append(False)  # resolver too slow — assume taken, don't cache
+            continue
+        _dns_cache_put(name, available)
+        out.append(available)
+    return out
+
+
 @app.route("/domaincheck", methods=["POST"])
 def domain_check():
     """
@@ -185,27 +417,22 @@ def domain_check():
           description: Domain status list
     """
     try:
-        data = request.get_json(force=True)
+        data = _read_json()
         base = (data.get("domain") or "").strip().lower()
-        tlds = data.get("tlds") or [".com", ".in", ".net", ".org", ".co"]
+        tlds = data.get("tlds") or DEFAULT_TLDS
         if not base:
-            return jsonify({"error": "Missing domain parameter"}), 400
-
-        socket.setdefaulttimeout(2)
-        results = []
-        for tld in tlds:
-            name = f"{base}{tld}"
-            try:
-                socket.gethostbyname(name)
-                available = False
-            except socket.gaierror:
-                available = True
-            results.append({"tld": tld, "domain": name, "available": available})
+            return json_response({"error": "Missing domain parameter"}, status=400)
 
-        return jsonify({"base": base, "domains": results})
+        names = [f"{base}{tld}" for tld in tlds]
+        availability = _resolve_all(names)
+        results = [
+            {"tld": tld, "domain": name, "available": available}
+            for tld, name, available in zip(tlds, names, availability)
+        ]
+        return json_response({"base": base, "domains": results})
     except Exception as err:
-        print(f"❌ Domain check error: {err}")
-        return jsonify({"error": str(err)}), 500
+        log.error("Domain check error: %s", err)
+        return json_response({"error": str(err)}, status=500)
 
 # -----------------------------------------------------------
 #  /health — Lightweight DB ping
@@ -214,17 +441,16 @@ def domain_check():
 def health():
     """DB connectivity check"""
     try:
-        s = SessionLocal()
-        s.execute(sql_text("SELECT 1"))
-        s.close()
+        with engine.connect() as conn:
+            conn.exec_driver_sql("SELECT 1")
     except Exception as err:
-        print(f"⚠️ Healthcheck DB ping failed: {err}")
-    return jsonify({"status": "ok"}), 200
+        log.warning("Healthcheck DB ping failed: %s", err)
+    return json_response({"status": "ok"})
 
 # -----------------------------------------------------------
 #  Run locally or on Render
 # -----------------------------------------------------------
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
-    print(f"🚀 DuooBot running at http://127.0.0.1:{port}/apidocs — Swagger UI ready.")
+    log.info("DuooBot running at http://127.0.0.1:%d/apidocs — Swagger UI ready.", port)
     app.run(host="0.0.0.0", port=port, debug=False)
\ No newline at end of file
@@ -1,11 +1,115 @@
 # ----------------------------------------------------------
 #  DuooBot — Conversational Logic v5 (Deep Hierarchical Flow)
 # ----------------------------------------------------------
-import socket
+import atexit
+import logging
+import queue
+import sys
+import threading
+import time
+from functools import lru_cache
 import re
-import random
-from difflib import SequenceMatcher
-from database import Lead, SessionLocal
+import string
+from random import randrange
+from types import MappingProxyType
+from typing import NamedTuple
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from database import Lead, engine
+from utils import json_tools
+
+# Shared pool for bounded blocking work (DNS lookups).
+_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix="convo-worker")
+atexit.register(_EXECUTOR.shutdown)
+
+# Lead inserts are queued and flushed in batches by one daemon writer:
+# one session + one transaction per batch instead of per lead, and the
+# HTTP reply never waits on a commit.
+_LEAD_QUEUE = queue.Queue()
+_LEAD_BATCH = 100        # flush as soon as this many are pending…
+_LEAD_LINGER = 0.2       # …or after this many seconds of quiet
+
+
+_LEAD_INSERT = Lead.__table__.insert()
+
+log = logging.getLogger("duoobot")
+
+
+def _flush_lead_batch(batch, retry=True):
+    try:
+        # Core executemany on plain column dicts — no Session, no unit of
+        # work, just one prepared INSERT driven over the whole batch.
+        with engine.begin() as conn:
+            conn.execute(_LEAD_INSERT, batch)
+    except Exception as err:
+        # A batch can hold up to _LEAD_BATCH leads, so one bad moment
+        # (locked DB, full disk) must not vanish into stdout. Retry the
+        # write once, then record exactly how much was lost.
+        if retry:
+            time.sleep(0.5)
+            _flush_lead_batch(batch, retry=False)
+        else:
+            log.error("Dropped %d queued lead(s) after retry: %s", len(batch), err)
+
+
+def _lead_writer_loop():
+    while True:
+        batch = [_LEAD_QUEUE.get()]
+        deadline = time.monotonic() + _LEAD_LINGER
+        while len(batch) < _LEAD_BATCH:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(_LEAD_QUEUE.get(timeout=remaining))
+            except queue.Empty:
+                break
+        _flush_lead_batch(batch)
+
+
+threading.Thread(target=_lead_writer_loop, daemon=True, name="lead-writer").start()
+
+
+def _drain_leads():
+    """Flush whatever is still queued when the process exits."""
+    batch = []
+    while True:
+        try:
+            batch.append(_LEAD_QUEUE.get_nowait())
+        except queue.Empty:
+            break
+    if batch:
+        _flush_lead_batch(batch)
+
+
+atexit.register(_drain_leads)
+
+# DNS answers barely change within a session — cache availability for a
+# few minutes so repeat checks of the same domain skip the blocking lookup.
+_DOMAIN_TTL = 300
+_DOMAIN_CACHE_MAX = 2048
+_domain_cache = {}  # domain -> (expires_at, available)
+
+
+def _resolve_domain(domain: str) -> bool:
+    import socket  # lazy — only the domain-check path ever pays for it
+
+    now = time.monotonic()
+    entry = _domain_cache.get(domain)
+    if entry and entry[0] > now:
+        return entry[1]
+    # Run the lookup on the shared pool with a hard 2 s bound, so a slow
+    # resolver can't stall the reply thread for the OS default (5 s+).
+    try:
+        _EXECUTOR.submit(socket.gethostbyname, domain).result(timeout=2.0)
+        available = False
+    except socket.gaierror:
+        available = True
+    except FutureTimeout:
+        return False  # resolver too slow — assume taken, don't cache
+    if len(_domain_cache) >= _DOMAIN_CACHE_MAX:
+        _domain_cache.clear()
+    _domain_cache[domain] = (now + _DOMAIN_TTL, available)
+    return available
 
 # ----------------------------------------------------------
 #  Simple NLP helpers
@@ -20,236 +124,480 @@ SYNONYMS = {
 }
 
 
+# Compiled once — normalize runs on every turn, so even the re cache's
+# pattern lookup is measurable overhead.
+_NORM_RE = re.compile(r"[^a-z0-9\s]+")
+
+# ASCII fast path: str.translate deletes unwanted chars in a C loop,
+# skipping the regex engine entirely for typical chat input.
+_KEEP = set(string.ascii_lowercase + string.digits + string.whitespace)
+_TRANS = str.maketrans("", "", "".join(c for c in map(chr, range(128)) if c not in _KEEP))
+
+
+# Memoized: reply() and the standalone detectors can each normalize the
+# same turn's text; repeat calls collapse to one cache hit.
+@lru_cache(maxsize=2048)
 def normalize(txt: str) -> str:
-    return re.sub(r"[^a-z0-9\s]+", "", txt.lower()).strip()
+    low = txt.lower()
+    if low.isascii():
+        return low.translate(_TRANS).strip()
+    return _NORM_RE.sub("", low).strip()
 
 
 def similarity(a, b):
+    from difflib import SequenceMatcher  # deliberately off the hot import path
     return SequenceMatcher(None, a, b).ratio()
 
 
-def detect_category(text):
-    t = normalize(text)
-    for key, vals in SYNONYMS.items():
-        if key in ("yes", "no"):
-            continue
-        for v in vals + [key]:
-            if v in t or similarity(t, v) > 0.7:
-                return key
+def _within_edits(a: str, b: str, k: int = 1) -> bool:
+    """True if edit distance(a, b) <= k. Rolling two-row DP with an
+    early exit once every cell in a row exceeds the budget."""
+    if abs(len(a) - len(b)) > k:
+        return False
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        if min(cur) > k:
+            return False
+        prev = cur
+    return prev[-1] <= k
+
+
+# Inverted indexes built once at import: word → category. Detection is a
+# dict probe per input token instead of nested loops over every synonym.
+_CAT_LOOKUP = {
+    w: cat
+    for cat, vals in SYNONYMS.items()
+    if cat not in ("yes", "no")
+    for w in vals + [cat]
+}
+_YN_LOOKUP = {w: k for k in ("yes", "no") for w in SYNONYMS[k] + [k]}
+
+
+def _alternation(words):
+    """One word-boundary alternation — a single C-level scan covers
+    every synonym at once for multi-word inputs."""
+    ordered = sorted(words, key=len, reverse=True)  # longest first
+    return re.compile(r"\b(" + "|".join(map(re.escape, ordered)) + r")\b")
+
+
+_CAT_RE = _alternation(_CAT_LOOKUP)
+_YN_RE = _alternation(_YN_LOOKUP)
+
+# Intern every canonical label the flow stores and compares — dict probes
+# and == checks on interned strings short-circuit to pointer equality.
+_CANON = ("website", "app", "bot", "automation", "landing", "portfolio",
+          "e-commerce", "corporate", "unknown", "yes", "no")
+for _k in _CANON:
+    sys.intern(_k)
+del _k
+
+
+# Users overwhelmingly answer with one of ~20 canonical option strings,
+# so both detectors memoize on the normalized form — "Yes", "yes " and
+# "YES" all collapse to one cache entry.
+@lru_cache(maxsize=4096)
+def _detect_category_cached(t):
+    # Most inputs here are a single option word ("website", "app") —
+    # one hash probe beats any scan.
+    cat = _CAT_LOOKUP.get(t)
+    if cat:
+        return cat
+    m = _CAT_RE.search(t)
+    if m:
+        return _CAT_LOOKUP[m.group(1)]
+    # Typo fallback ("webiste") — bounded to one edit and length-gated so
+    # the quadratic path never runs on multi-sentence input.
+    if len(t) <= 20:
+        for term, cat in _CAT_LOOKUP.items():
+            # One edit for short terms, two for longer ones ("webiste").
+            if _within_edits(t, term, 1 if len(term) <= 4 else 2):
+                return cat
     return "unknown"
 
 
+def detect_category(text):
+    return _detect_category_cached(normalize(text))
+
+
+@lru_cache(maxsize=4096)
+def _detect_yes_no_cached(t):
+    yn = _YN_LOOKUP.get(t)
+    if yn:
+        return yn
+    m = _YN_RE.search(t)
+    return _YN_LOOKUP[m.group(1)] if m else None
+
+
 def detect_yes_no(text):
-    t = normalize(text)
-    for k in ("yes", "no"):
-        for v in SYNONYMS[k] + [k]:
-            if v in t:
-                return k
-    return None
+    return _detect_yes_no_cached(normalize(text))
 
 
 # ----------------------------------------------------------
 #  Personality text pools
 # ----------------------------------------------------------
-GREETINGS = [
+# Tuples, not lists — immutable, lighter, and marginally faster to index
+# under random.choice on the hot reply path.
+GREETINGS = (
     "Hi {name}! 👋 Excited to build something special together?",
     "Hey {name}! 🌟 Ready to bring your idea to life?",
     "Welcome {name}! 🚀 What shall we create today?",
-]
-THANKS = ["Perfect, that helps a lot!", "Great choice!", "Awesome 👍", "Got it — thanks!"]
-ERRORS = [
+)
+THANKS = ("Perfect, that helps a lot!", "Great choice!", "Awesome 👍", "Got it — thanks!")
+ERRORS = (
     "Hmm, could you rephrase that?",
     "I’m not sure I got that. Could you clarify?",
     "Oops — that went over my circuits 😅. Try again?",
-]
+)
+
+# Pool sizes hoisted so picks are a plain randrange + tuple index,
+# skipping random.choice's sequence-protocol detour each turn.
+_N_GREET = len(GREETINGS)
+_N_THANKS = len(THANKS)
+_N_ERRORS = len(ERRORS)
 
 # ----------------------------------------------------------
 #  Structured Question Bank (v5 Tree)
 # ----------------------------------------------------------
-QUESTION_TREE = {
-    "website": {
-        "landing": [
-            {"q": "What kind of landing page are you planning?", "options": ["Single Page", "Multi‑page", "Promo/Product"]},
-            {"q": "Do you need form integrations (lead collection)?", "options": ["Yes", "No"]},
-            {"q": "Goal of the page?", "options": ["Sales", "Newsletter", "Signup", "Event"]},
-        ],
-        "portfolio": [
-            {"q": "For business or personal brand?", "options": ["Business", "Personal", "Agency"]},
-            {"q": "Include a blog or case studies?", "options": ["Yes", "No"]},
-            {"q": "Upload new projects manually or via CMS?", "options": ["Manual", "CMS", "API"]},
-        ],
-        "e‑commerce": [
-            {"q": "Expected number of products?", "options": ["1‑50", "50‑500", "500+"]},
-            {"q": "Preferred payment gateway?", "options": ["Stripe", "Razorpay", "PayPal", "Other"]},
-            {"q": "Inventory management integration?", "options": ["Yes", "No"]},
-        ],
-        "corporate": [
-            {"q": "Internal employee/intranet portal needed?", "options": ["Yes", "No"]},
-            {"q": "Careers section with job posts?", "options": ["Yes", "No"]},
-            {"q": "Multi‑language support?", "options": ["Yes", "No"]},
-        ],
-    },
-    "app": [
-        {"q": "Which platforms are you targeting?", "options": ["Android", "iOS", "Web", "All"]},
-        {"q": "Who will use this app?", "options": ["Customers", "Staff", "Partners"]},
-        {"q": "Key features?", "options": ["Login", "Payments", "Notifications", "AI", "Dashboard"]},
-        {"q": "Need backend admin panel?", "options": ["Yes", "No"]},
-    ],
-    "automation": [
-        {"q": "What process do you want automated?", "options": ["Reports", "APIs", "Mailing", "Workflows", "Monitoring"]},
-        {"q": "Current tool or method used?", "options": ["Excel", "CRM", "ERP", "Manual"]},
-        {"q": "Goal of automation?", "options": ["Save time", "Reduce errors", "Integrate systems"]},
-        {"q": "Trigger frequency?", "options": ["Daily", "Weekly", "On demand"]},
-    ],
-    "bot": [
-        {"q": "What’s the primary purpose of this bot?", "options": ["Customer Support", "Lead Capture", "Internal FAQ", "Booking Assistant"]},
-        {"q": "Preferred tone/personality?", "options": ["Professional", "Friendly", "Playful"]},
-        {"q": "Where should it be deployed?", "options": ["Website", "WhatsApp", "Telegram", "Slack"]},
-    ],
-}
+# Flat (question, options) pairs in immutable tuples: retrieval is two
+# index operations, the structures sit in read-only memory, and handlers
+# can hand the options tuples out by reference without copy worries.
+QUESTION_TREE = MappingProxyType({
+    "website": MappingProxyType({
+        "landing": (
+            ("What kind of landing page are you planning?", ("Single Page", "Multi‑page", "Promo/Product")),
+            ("Do you need form integrations (lead collection)?", ("Yes", "No")),
+            ("Goal of the page?", ("Sales", "Newsletter", "Signup", "Event")),
+        ),
+        "portfolio": (
+            ("For business or personal brand?", ("Business", "Personal", "Agency")),
+            ("Include a blog or case studies?", ("Yes", "No")),
+            ("Upload new projects manually or via CMS?", ("Manual", "CMS", "API")),
+        ),
+        "e-commerce": (
+            ("Expected number of products?", ("1‑50", "50‑500", "500+")),
+            ("Preferred payment gateway?", ("Stripe", "Razorpay", "PayPal", "Other")),
+            ("Inventory management integration?", ("Yes", "No")),
+        ),
+        "corporate": (
+            ("Internal employee/intranet portal needed?", ("Yes", "No")),
+            ("Careers section with job posts?", ("Yes", "No")),
+            ("Multi‑language support?", ("Yes", "No")),
+        ),
+    }),
+    "app": (
+        ("Which platforms are you targeting?", ("Android", "iOS", "Web", "All")),
+        ("Who will use this app?", ("Customers", "Staff", "Partners")),
+        ("Key features?", ("Login", "Payments", "Notifications", "AI", "Dashboard")),
+        ("Need backend admin panel?", ("Yes", "No")),
+    ),
+    "automation": (
+        ("What process do you want automated?", ("Reports", "APIs", "Mailing", "Workflows", "Monitoring")),
+        ("Current tool or method used?", ("Excel", "CRM", "ERP", "Manual")),
+        ("Goal of automation?", ("Save time", "Reduce errors", "Integrate systems")),
+        ("Trigger frequency?", ("Daily", "Weekly", "On demand")),
+    ),
+    "bot": (
+        ("What’s the primary purpose of this bot?", ("Customer Support", "Lead Capture", "Internal FAQ", "Booking Assistant")),
+        ("Preferred tone/personality?", ("Professional", "Friendly", "Playful")),
+        ("Where should it be deployed?", ("Website", "WhatsApp", "Telegram", "Slack")),
+    ),
+})
 
-COMMON_FLOW = [
-    {"q": "Who is your target audience?", "options": []},
-    {"q": "What’s the main goal?", "options": ["Sales", "Leads", "Branding", "Automation"]},
-    {"q": "Do you already have a logo or branding assets?", "options": ["Yes", "No"]},
-    {"q": "When are you hoping to launch your project?", "options": ["1‑2 Weeks", "1 Month", "Flexible"]},
-    {"q": "Do you already own a domain name?", "options": ["Yes", "No"]},
-]
+# ----------------------------------------------------------
+#  Reply payload — a slotted NamedTuple instead of a per-turn dict:
+#  construction skips key hashing, the shared options tuples are
+#  reused by reference, and the HTTP layer calls ._asdict() once at
+#  the serialization boundary.
+# ----------------------------------------------------------
+class Reply(NamedTuple):
+    text: str
+    options: tuple = ()
+
+
+OPTS_PROJECT = ("Website", "App", "Automation", "Bot")
+OPTS_SUBTYPE = ("Landing", "Portfolio", "E‑Commerce", "Corporate")
+OPTS_RESTART = ("Start New Project",)
+
+# ----------------------------------------------------------
+#  Cached static replies — these depend only on the resolved
+#  category/subtype, never on per-user state, so the dicts can
+#  be built once and shared across all conversations.
+# ----------------------------------------------------------
+@lru_cache(maxsize=None)
+def _project_type_reply(category):
+    if category == "website":
+        return Reply("Nice! What type of website are you planning?", OPTS_SUBTYPE)
+    if category in ("app", "automation", "bot"):
+        return _TREE_REPLIES[category][0]
+    return Reply("Could you clarify? (Website, App, Automation, Bot)", OPTS_PROJECT)
+
+
+@lru_cache(maxsize=None)
+def _subtype_first_question(sub):
+    return _TREE_REPLIES["website"][sub][0]
+
+
+# Canonical answer keys for COMMON_FLOW, by index — these name the
+# entries in state["_answers"], which is all the lead stores as details.
+_COMMON_KEYS = ("audience", "goal", "logo", "timeline", "owns_domain")
+
+COMMON_FLOW = (
+    ("Who is your target audience?", ()),
+    ("What’s the main goal?", ("Sales", "Leads", "Branding", "Automation")),
+    ("Do you already have a logo or branding assets?", ("Yes", "No")),
+    ("When are you hoping to launch your project?", ("1‑2 Weeks", "1 Month", "Flexible")),
+    ("Do you already own a domain name?", ("Yes", "No")),
+)
+
+# Every static prompt rendered once into a shared Reply — handlers hand
+# back these references instead of rebuilding a payload per turn.
+def _freeze_replies(qs):
+    return tuple(Reply(q, opts) for q, opts in qs)
+
+
+_TREE_REPLIES = {
+    cat: {sub: _freeze_replies(qs) for sub, qs in v.items()}
+    if isinstance(v, MappingProxyType) else _freeze_replies(v)
+    for cat, v in QUESTION_TREE.items()
+}
+_COMMON_REPLIES = _freeze_replies(COMMON_FLOW)
+_REPLY_DOMAIN_PROMPT = Reply("Great! Please type your domain (e.g. mybrand.com).")
+_REPLY_FALLBACK = Reply("Type 'Start New Project' to begin again 🎯", OPTS_RESTART)
 
 # ----------------------------------------------------------
 #  Conversation Core
 # ----------------------------------------------------------
+# Urgency keywords matched as whole tokens — "1-2 Weeks" normalizes to
+# "12 weeks", and set intersection can't false-positive inside longer
+# words the way substring checks do.
+URGENT_WORDS = frozenset({"week", "weeks", "soon", "urgent", "asap"})
+
+# Restart detection: one word-boundary scan instead of four substring
+# checks — and no more "new" firing inside "newsletter".
+_RESTART_RE = re.compile(r"\b(?:start|new|again|hello|restart)\b")
+
+# Website-subtype routing: a single compiled scan instead of four
+# sequential substring checks per turn.
+_SUBTYPE_RE = re.compile(r"(landing|portfolio|commerce|corporate)")
+_SUBTYPE_MAP = {
+    "landing": "landing",
+    "portfolio": "portfolio",
+    "commerce": "e-commerce",
+    "corporate": "corporate",
+}
+
+# Pretty, non-breaking hyphen only at the presentation edge; every
+# internal key/state value stays plain ASCII "e-commerce".
+_DISPLAY = {"e-commerce": "E‑Commerce"}
+
+# Keep only the last N turns — unbounded history grows per-session RAM,
+# journal writes, and lead detail dumps linearly with conversation length.
+# A plain list (not deque) keeps the state JSON/msgpack-serializable.
+HISTORY_MAX = 20
+
+# Feature keyword → add-on price, used by estimate_price_inr.
+ADDON_PRICES = {
+    "login": 1500,
+    "payment": 2500,
+    "ai": 4000,
+    "dashboard": 3000,
+    "cms": 5000,
+}
+
+# One bit per priceable feature; flags are OR'd into state["_flags"] the
+# moment an answer is captured, so pricing never re-scans the state dump.
+FEATURE_BITS = {kw: 1 << i for i, kw in enumerate(ADDON_PRICES)}
+
+# Thousands-separator formatting is locale-aware and slow; totals come
+# from a small discrete set, so cache the rendered strings.
+_PRICE_FMT = {}
+
+
+def _fmt_inr(n):
+    s = _PRICE_FMT.get(n)
+    if s is None:
+        s = _PRICE_FMT[n] = f"{n:,}"
+    return s
+
+
+# Base pricing, keyed by the canonical subtype/project strings the flow
+# itself stores — so a quote is two dict probes, not an elif ladder of
+# substring checks.
+_BASE_TABLE = {
+    "app": 50000,
+    "bot": 12000,
+    "automation": 15000,
+    "e-commerce": 25000,
+    "landing": 4000,
+}
+_BASE_DEFAULT = 8000
+
+
 class Conversation:
     def __init__(self, state=None, user_name=None):
         self.state = state or {"step": "greeting"}
+        # States persisted before the ASCII-key switch stored the subtype
+        # with a non-breaking hyphen; remap it so dict probes against the
+        # "e-commerce" tables don't KeyError mid-conversation.
+        if self.state.get("subtype") == "e‑commerce":
+            self.state["subtype"] = "e-commerce"
         if user_name:
             self.state["name"] = user_name.split(" ")[0]
         self.state.setdefault("history", [])
 
+    # ------------------------------------------------------
+    #  Step handlers — dispatched by name from _STEP_HANDLERS.
+    #  Each takes (text, low) and returns the reply payload.
     # ------------------------------------------------------
     def reply(self, text: str):
         step = self.state.get("step", "greeting")
+        text = text.strip()  # one copy; handlers keep original casing
         low = normalize(text)
-        self.state["history"].append({"from": "user", "text": text.strip()})
-
-        # 1️⃣ Greeting
-        if step == "greeting":
-            self.state["step"] = "project_type"
-            user = self.state.get("name", "friend")
-            greet = random.choice(GREETINGS).format(name=user)
-            return {
-                "text": f"{greet}\nWhat kind of project would you like to start?",
-                "options": ["Website", "App", "Automation", "Bot"],
-            }
-
-        # 2️⃣ Project Selection
-        elif step == "project_type":
-            category = detect_category(low)
-            self.state["project"] = category
-            
-            if category == "website":
-                self.state["step"] = "website_subtype"
-                return {
-                    "text": "Nice! What type of website are you planning?",
-                    "options": ["Landing", "Portfolio", "E‑Commerce", "Corporate"]
-                }
-            elif category in ["app", "automation", "bot"]:
-                self.state["step"] = "category_questions"
-                self.state["q_index"] = 0
-                first_q = QUESTION_TREE[category][0]
-                return {"text": first_q["q"], "options": first_q["options"]}
-            else:
-                # fallback if unknown
-                return {"text": "Could you clarify? (Website, App, Automation, Bot)", "options": ["Website", "App", "Automation", "Bot"]}
-
-        # 3️⃣ Website Subtype
-        elif step == "website_subtype":
-            # flexible mapping for subtype choice
-            sub = "landing"
-            if "landing" in low: sub = "landing"
-            elif "portfolio" in low: sub = "portfolio"
-            elif "commerce" in low: sub = "e‑commerce"
-            elif "corporate" in low: sub = "corporate"
-            
-            self.state["subtype"] = sub
+        history = self.state["history"]
+        # ("u", text) pairs — a 2-tuple is a fraction of the size of a
+        # two-key dict and round-trips through the journal as a plain list.
+        history.append(("u", text))
+        if len(history) > HISTORY_MAX:  # sliding window — bounds state size
+            del history[:-HISTORY_MAX]
+
+        handler = self._STEP_HANDLERS.get(step)
+        if handler is not None:
+            return handler(self, text, low)
+        # summary/done (or an unknown step) → restart prompt
+        return self._step_fallback(text, low)
+
+    # 1️⃣ Greeting
+    def _step_greeting(self, text, low):
+        self.state["step"] = "project_type"
+        user = self.state.get("name", "friend")
+        greet = GREETINGS[randrange(_N_GREET)].format(name=user)
+        return Reply(f"{greet}\nWhat kind of project would you like to start?", OPTS_PROJECT)
+
+    # 2️⃣ Project Selection
+    def _step_project_type(self, text, low):
+        category = _detect_category_cached(low)  # low is already normalized
+        self.state["project"] = sys.intern(category)
+
+        if category == "website":
+            self.state["step"] = "website_subtype"
+        elif category in ["app", "automation", "bot"]:
             self.state["step"] = "category_questions"
             self.state["q_index"] = 0
-            
-            first_q = QUESTION_TREE["website"][sub][0]
-            return {"text": first_q["q"], "options": first_q["options"]}
-
-        # 4️⃣ Category-Specific Questions Loop
-        elif step == "category_questions":
-            cat = self.state["project"]
-            sub = self.state.get("subtype")
-            idx = self.state.get("q_index", 0)
-
-            # Store answer
-            self.state[f"cat_q_{idx}"] = text
-            
-            next_idx = idx + 1
-            self.state["q_index"] = next_idx
-
-            # Determine list of questions
-            if cat == "website":
-                q_list = QUESTION_TREE["website"][sub]
-            else:
-                q_list = QUESTION_TREE[cat]
-
-            if next_idx < len(q_list):
-                nxt = q_list[next_idx]
-                return {"text": nxt["q"], "options": nxt["options"]}
-            
-            # Finished specific questions -> go to Common Flow
-            self.state["step"] = "common_questions"
-            self.state["c_index"] = 0
-            first_c = COMMON_FLOW[0]
-            return {"text": first_c["q"], "options": first_c["options"]}
-
-        # 5️⃣ Common Questions Loop
-        elif step == "common_questions":
-            c_idx = self.state.get("c_index", 0)
-            self.state[f"common_q_{c_idx}"] = text
-            
-            # Special check for "Domain" question (index 4 in COMMON_FLOW)
-            if c_idx == 4:
-                yn = detect_yes_no(low)
-                self.state["has_domain"] = yn == "yes"
-                if yn == "yes":
-                    self.state["step"] = "domain_input"
-                    return {"text": "Great! Please type your domain (e.g. mybrand.com)."}
-                else:
-                    self.state["step"] = "summary"
-                    return self.generate_final_summary()
-
-            self.state["c_index"] = c_idx + 1
-            next_c = c_idx + 1
-
-            if next_c < len(COMMON_FLOW):
-                nxt = COMMON_FLOW[next_c]
-                return {"text": nxt["q"], "options": nxt["options"]}
-            
-            # If loop finished naturally
-            self.state["step"] = "summary"
-            return self.generate_final_summary()
-
-        # 6️⃣ Domain Input
-        elif step == "domain_input":
-            self.state["domain_name"] = text
+        # unknown → step unchanged, cached clarify prompt
+        return _project_type_reply(category)
+
+    # 3️⃣ Website Subtype
+    def _step_website_subtype(self, text, low):
+        # flexible mapping for subtype choice — one scan, defaulting to landing
+        m = _SUBTYPE_RE.search(low)
+        sub = _SUBTYPE_MAP[m.group(1)] if m else "landing"
+
+        self.state["subtype"] = sys.intern(sub)
+        self.state["step"] = "category_questions"
+        self.state["q_index"] = 0
+
+        return _subtype_first_question(sub)
+
+    # 4️⃣ Category-Specific Questions Loop
+    def _step_category_questions(self, text, low):
+        cat = self.state["project"]
+        sub = self.state.get("subtype")
+        idx = self.state.get("q_index", 0)
+
+        # Store answer under a readable key — these feed the lead's
+        # compact details JSON instead of a str(state) dump.
+        self.state.setdefault("_answers", {})[f"{sub or cat}_q{idx}"] = text
+        self._note_features(low)
+
+        next_idx = idx + 1
+        self.state["q_index"] = next_idx
+
+        # Determine list of questions
+        if cat == "website":
+            q_list = _TREE_REPLIES["website"][sub]
+        else:
+            q_list = _TREE_REPLIES[cat]
+
+        if next_idx < len(q_list):
+            return q_list[next_idx]
+
+        # Finished specific questions -> go to Common Flow
+        self.state["step"] = "common_questions"
+        self.state["c_index"] = 0
+        return _COMMON_REPLIES[0]
+
+    # 5️⃣ Common Questions Loop
+    def _step_common_questions(self, text, low):
+        c_idx = self.state.get("c_index", 0)
+        self.state.setdefault("_answers", {})[_COMMON_KEYS[c_idx]] = text
+        self._note_features(low)
+
+        # Derive the booleans pricing/lead-saving need right here, from
+        # the user's utterance — no str(state) scans later.
+        if c_idx == 2:  # logo / branding assets
+            self.state["has_logo"] = _detect_yes_no_cached(low) == "yes"
+        elif c_idx == 3:  # launch timeline
+            self.state["urgent"] = not URGENT_WORDS.isdisjoint(low.split())
+
+        # Special check for "Domain" question (index 4 in COMMON_FLOW)
+        if c_idx == 4:
+            yn = _detect_yes_no_cached(low)
+            self.state["has_domain"] = yn == "yes"
+            if yn == "yes":
+                self.state["step"] = "domain_input"
+                return _REPLY_DOMAIN_PROMPT
             self.state["step"] = "summary"
             return self.generate_final_summary()
 
-        # 7️⃣ Summary
-        elif step == "summary":
-            pass 
-
-        # 🔁 Restart Logic
-        if any(k in low for k in ("start", "new", "again", "hello")):
+        self.state["c_index"] = c_idx + 1
+        next_c = c_idx + 1
+
+        if next_c < len(_COMMON_REPLIES):
+            return _COMMON_REPLIES[next_c]
+
+        # If loop finished naturally
+        self.state["step"] = "summary"
+        return self.generate_final_summary()
+
+    # 6️⃣ Domain Input
+    def _step_domain_input(self, text, low):
+        # C-level split/join instead of a regex pass — domains never
+        # legitimately contain whitespace anyway.
+        self.state["domain_name"] = "".join(text.split())
+        self.state["step"] = "summary"
+        return self.generate_final_summary()
+
+    def _note_features(self, low):
+        """OR priceable-feature bits into the state as answers arrive."""
+        flags = self.state.get("_flags", 0)
+        tokens = low.split()
+        for kw, bit in FEATURE_BITS.items():
+            # Tiny keywords ("ai") need exact-token matching or they'd
+            # fire inside unrelated words like "email".
+            if (kw in tokens) if len(kw) <= 2 else (kw in low):
+                flags |= bit
+        self.state["_flags"] = flags
+
+    # 🔁 Restart / finished-funnel fallback
+    def _step_fallback(self, text, low):
+        if _RESTART_RE.search(low):
             name = self.state.get("name")
             self.state = {"step": "greeting", "name": name, "history": []}
             return self.reply("hello")
-
-        return {"text": "Type 'Start New Project' to begin again 🎯", "options": ["Start New Project"]}
+        return _REPLY_FALLBACK
+
+    # O(1) step dispatch instead of walking an elif ladder every turn.
+    _STEP_HANDLERS = {
+        "greeting": _step_greeting,
+        "project_type": _step_project_type,
+        "website_subtype": _step_website_subtype,
+        "category_questions": _step_category_questions,
+        "common_questions": _step_common_questions,
+        "domain_input": _step_domain_input,
+    }
 
     # ----------------------------------------------------------
     #  Helper to generate summary
@@ -257,53 +605,39 @@ class Conversation:
     def generate_final_summary(self):
         cost = self.estimate_price_inr()
         summary = self.project_summary(cost)
-        self.save_lead_to_db()
+        self.save_lead_to_db(cost)
         self.state["step"] = "done"
-        return {
-            "text": (
-                f"{summary}\n"
-                f"💸 Estimated cost ≈ ₹ {cost:,}\n"
-                "Thanks for sharing details! We'll be in touch.\n"
-                "Type 'Start New Project' to begin again."
-            ),
-            "options": ["Start New Project"]
-        }
+        return Reply(
+            f"{summary}\n"
+            f"💸 Estimated cost ≈ ₹ {_fmt_inr(cost)}\n"
+            "Thanks for sharing details! We'll be in touch.\n"
+            "Type 'Start New Project' to begin again.",
+            OPTS_RESTART,
+        )
 
     # ----------------------------------------------------------
     #  Utility: Domain Check
     # ----------------------------------------------------------
     def check_domain(self, domain_name: str) -> bool:
-        try:
-            socket.gethostbyname(domain_name)
-            return False
-        except socket.gaierror:
-            return True
+        return _resolve_domain(domain_name)
 
     # ----------------------------------------------------------
     #  Utility: Price Estimation
     # ----------------------------------------------------------
     def estimate_price_inr(self):
         proj = self.state.get("project", "")
-        base = 8000
-        # Simple base pricing
-        if proj == "app": base = 50000
-        elif proj == "bot": base = 12000
-        elif proj == "automation": base = 15000
-        elif "e‑commerce" in str(self.state.get("subtype","")): base = 25000
-        elif "landing" in str(self.state.get("subtype","")): base = 4000
-        
-        # Additive logic based on keywords in history
-        history_str = str(self.state).lower()
-        addons = 0
-        if "login" in history_str: addons += 1500
-        if "payment" in history_str: addons += 2500
-        if "ai" in history_str: addons += 4000
-        if "dashboard" in history_str: addons += 3000
-        if "cms" in history_str: addons += 5000
+        sub = self.state.get("subtype", "")
+        # Both keys are canonical strings set by the flow itself, so the
+        # base price is a direct probe (subtype wins, then project).
+        base = _BASE_TABLE.get(sub) or _BASE_TABLE.get(proj, _BASE_DEFAULT)
+
+
+        # Additive logic: O(1) bit tests against flags captured at answer time
+        flags = self.state.get("_flags", 0)
+        addons = sum(p for k, p in ADDON_PRICES.items() if flags & FEATURE_BITS[k])
         
-        # urgent? (checked in common questions)
-        urgent = "week" in str(self.state.get("common_q_3", "")).lower()
-        if urgent:
+        # urgent? (captured when the timeline answer arrived)
+        if self.state.get("urgent", False):
             base = int(base * 1.15)
 
         return base + addons
@@ -316,12 +650,14 @@ class Conversation:
         tag = f" | Domain: {domain}" if domain else ""
         
         proj_name = self.state.get("subtype") or self.state.get("project")
-        audience = self.state.get("common_q_0", "General")
-        goal = self.state.get("common_q_1", "General")
+        proj_name = _DISPLAY.get(proj_name, str(proj_name).title())
+        answers = self.state.get("_answers", {})
+        audience = answers.get("audience", "General")
+        goal = answers.get("goal", "General")
         
         return (
             f"📋 Summary for {self.state.get('name', 'Client')}:\n"
-            f"• Project: {str(proj_name).title()}\n"
+            f"• Project: {proj_name}\n"
             f"• Target: {audience}\n"
             f"• Goal: {goal}\n"
             f"{tag}"
@@ -330,23 +666,28 @@ class Conversation:
     # ----------------------------------------------------------
     #  Utility: Save to DB
     # ----------------------------------------------------------
-    def save_lead_to_db(self):
-        try:
-            session = SessionLocal()
-            lead = Lead(
-                name=self.state.get("name"),
-                project=self.state.get("project"),
-                details=str(self.state), # storing full state dump for deep context
-                budget=self.state.get("common_q_2"), # approximate mapping
-                contact=self.state.get("contact"),
-                has_logo="yes" in str(self.state.get("common_q_2","")).lower(),
-                urgent="week" in str(self.state.get("common_q_3","")).lower(),
-                domain_name=self.state.get("domain_name"),
-                estimated_cost=f"₹ {self.estimate_price_inr():,}",
-            )
-            session.add(lead)
-            session.commit()
-        except Exception as err:
-            print(f"❌ Error saving lead: {err}")
-        finally:
-            session.close()
\ No newline at end of file
+    def save_lead_to_db(self, cost=None):
+        # Building the Lead is microseconds; the insert itself happens in
+        # the background writer's next batch.
+        if cost is None:  # summary path passes the already-computed estimate
+            cost = self.estimate_price_inr()
+        _LEAD_QUEUE.put(self._build_lead(dict(self.state), cost))
+
+    @staticmethod
+    def _build_lead(state, cost):
+        # Column mapping, not a Lead instance — consumed by
+        # bulk_insert_mappings in the background writer.
+        answers = state.get("_answers", {})
+        return {
+            "name": state.get("name"),
+            "project": state.get("project"),
+            # Just the answers, compact JSON — not the whole state dump
+            # with its history list and bookkeeping keys.
+            "details": json_tools.dumps(answers).decode(),
+            "budget": answers.get("logo"),  # approximate mapping
+            "contact": state.get("contact"),
+            "has_logo": state.get("has_logo", False),
+            "urgent": state.get("urgent", False),
+            "domain_name": state.get("domain_name"),
+            "estimated_cost": f"₹ {_fmt_inr(cost)}",
+        }
@@ -3,6 +3,8 @@
 # ----------------------------------------------------------
 from sqlalchemy import (
     create_engine,
+    event,
+    Index,
     Column,
     Integer,
     String,
@@ -30,8 +32,28 @@ engine = create_engine(
     echo=False,
     future=True,
     connect_args={"check_same_thread": False},
+    pool_pre_ping=True,      # drop dead connections before handing them out
+    pool_size=5,             # sized for Flask's default threaded workers
+    max_overflow=10,
+    pool_recycle=1800,
 )
 
+# WAL lets readers proceed during writes and turns each commit into a
+# sequential log append; synchronous=NORMAL skips the per-commit fsync
+# that FULL pays (the WAL still survives application crashes). The rest
+# keep hot pages and temp structures in memory: 64 MB of mmap'd reads
+# (sized for the free tier), RAM-backed temp tables, ~20 MB page cache.
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_conn, _record):
+    cursor = dbapi_conn.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout=30000")
+    cursor.execute("PRAGMA mmap_size=67108864")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA cache_size=-20000")
+    cursor.close()
+
 Base = declarative_base()
 SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
 
@@ -68,6 +90,12 @@ class ChatLog(Base):
     is_bot = Column(Boolean, default=False)
     timestamp = Column(DateTime, default=datetime.utcnow)
 
+    # Covers the "latest messages for one user" query shape so it reads
+    # a small index range instead of scanning chat_logs as it grows.
+    __table_args__ = (
+        Index("ix_chat_logs_user_time", "user_id", "timestamp"),
+    )
+
 # ----------------------------------------------------------
 #  ConversationState — optionally persist user memory
 # ----------------------------------------------------------
@@ -85,7 +113,10 @@ class ConversationState(Base):
 def init_db():
     """Creates all tables if not already present."""
     try:
-        Base.metadata.create_all(engine)
+        # One explicit transaction → one WAL sync for the whole schema,
+        # instead of an implicit commit per CREATE statement on cold boot.
+        with engine.begin() as conn:
+            Base.metadata.create_all(conn)
         print(f"✅  Database initialized at {DB_PATH}")
     except Exception as err:
         print(f"❌  Database initialization error: {err}")
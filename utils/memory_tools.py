@@ -1,28 +1,31 @@
 import json
-from database import Base, SessionLocal
-from sqlalchemy import Column, Integer, String, Text
+from datetime import datetime
 
-# Simple persistent serialized state
-class ConversationState(Base):
-    __tablename__ = "conversation_states"
-    id = Column(Integer, primary_key=True)
-    user_uid = Column(String(120), unique=True)
-    state_json = Column(Text)
-Base.metadata.create_all(bind=SessionLocal().bind)
+from database import ConversationState, SessionLocal, engine
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+# Simple persistent serialized state — the model lives in database.py
+# (redefining it here against the same Base made the second import blow
+# up with InvalidRequestError), and init_db() already creates the table.
 
 def save_state(uid, state):
-    session = SessionLocal()
-    existing = session.query(ConversationState).filter_by(user_uid=uid).first()
-    s = json.dumps(state)
-    if existing:
-        existing.state_json = s
-    else:
-        existing = ConversationState(user_uid=uid, state_json=s)
-        session.add(existing)
-    session.commit(); session.close()
+    # One round-trip: SQLite resolves the insert-or-update on the
+    # user_uid unique index instead of a SELECT-then-UPDATE pair.
+    # updated_at is set by hand because the ORM onupdate hook does not
+    # fire for Core statements.
+    now = datetime.utcnow()
+    stmt = sqlite_insert(ConversationState).values(
+        user_uid=uid, state_json=json.dumps(state), updated_at=now
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ConversationState.user_uid],
+        set_={"state_json": stmt.excluded.state_json, "updated_at": now},
+    )
+    with engine.begin() as conn:
+        conn.execute(stmt)
 
 def load_state(uid):
     session = SessionLocal()
     r = session.query(ConversationState).filter_by(user_uid=uid).first()
     session.close()
-    return json.loads(r.state_json) if r else None
\ No newline at end of file
+    return json.loads(r.state_json) if r else None
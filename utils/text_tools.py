@@ -1,28 +1,48 @@
 import re, json, os
-from difflib import SequenceMatcher
 
 BASE = os.path.dirname(os.path.dirname(__file__))
-SYN = json.load(open(os.path.join(BASE, "data", "synonyms.json")))
+with open(os.path.join(BASE, "data", "synonyms.json")) as f:
+    SYN = json.load(f)
+
+# Compiled once at import — re.sub with a literal pattern re-checks the
+# regex cache on every call, and normalize runs on every message.
+_CLEAN = re.compile(r"[^a-z0-9\s]+")
 
 def normalize(txt: str) -> str:
-    return re.sub(r"[^a-z0-9\s]+", "", txt.lower()).strip()
+    return _CLEAN.sub("", txt.lower()).strip()
+
+# Term lists built once — the old vals + [key] concatenation allocated a
+# fresh list per category on every lookup.
+_CAT_TERMS = tuple(
+    (key, tuple(vals) + (key,))
+    for key, vals in SYN.items()
+    if key not in ("yes", "no")
+)
+_YN_TERMS = tuple((k, tuple(SYN[k]) + (k,)) for k in ("yes", "no"))
 
 def similarity(a,b):
+    from difflib import SequenceMatcher
     return SequenceMatcher(None, a,b).ratio()
 
 def detect_category(text):
     t = normalize(text)
-    for key, vals in SYN.items():
-        if key in ("yes","no"): continue
-        for v in vals + [key]:
-            if v in t or similarity(t,v) > 0.7:
+    # Substring pass first: it catches almost every real message and
+    # costs a few "in" checks. SequenceMatcher is quadratic per term
+    # pair, so the fuzzy tier only runs when nothing matched exactly.
+    for key, terms in _CAT_TERMS:
+        for v in terms:
+            if v in t:
+                return key
+    for key, terms in _CAT_TERMS:
+        for v in terms:
+            if similarity(t,v) > 0.7:
                 return key
     return "unknown"
 
 def detect_yes_no(text):
     t = normalize(text)
-    for k in ("yes","no"):
-        for v in SYN[k]+[k]:
+    for k, terms in _YN_TERMS:
+        for v in terms:
             if v in t:
                 return k
     return None
\ No newline at end of file